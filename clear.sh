@@ -2,5 +2,6 @@ rm -rf data/maps/*
 rm -rf data/embeddings/*
 rm -rf data/logs/*
 rm -rf data/sessions.pkl
+rm -rf data/sessions.db*
 rm -rf data/reader.txt
 rm -rf state.yaml
\ No newline at end of file
@@ -21,7 +21,7 @@ device_src_path = str(Path(__file__).parent / 'src')
 sys.path.insert(0, device_src_path)
 sys.path.insert(0, str(Path(__file__).parent / 'src' / 'general'))
 
-from device.init_map_wrapper import call_server_init_map
+from device.init_map_wrapper import call_server_init_map_async, close_http_session
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -209,7 +209,7 @@ class DroneListener:
             await self._update_server_progress("Requesting cached map data...", 50)
             
             # Call init_map_wrapper with the session_id to get cached data
-            result = call_server_init_map(
+            result = await call_server_init_map_async(
                 lat=0, lng=0, meters=0,  # These will be ignored with session_id
                 session_id=session_id
             )
@@ -335,6 +335,8 @@ class DroneListener:
             self.listen_socket.close()
             self.listen_socket = None
         
+        await close_http_session()
+        
         logger.info("Listener cleanup complete")
 
 
@@ -5,7 +5,6 @@ Serves as adapter between TCP sockets and server library functions.
 """
 
 import sys
-import os
 import json
 import socket
 import threading
@@ -22,7 +21,7 @@ sys.path.insert(0, str(Path(__file__).parent / 'src' / 'general'))
 from general.fetch_gps import process_fetch_gps_request
 from models import InitMapRequest, FetchGpsRequest, VisualizePathRequest, SessionData
 from device.init_map_wrapper import call_server_init_map
-import pickle
+from device.session_store import load_sessions
 import time
 
 class DeviceLocalizer:
@@ -59,16 +58,11 @@ class DeviceLocalizer:
 
     def _load_sessions(self):
         """Load sessions from local storage."""
-        sessions_file = "data/sessions.pkl"
-        if os.path.exists(sessions_file):
-            try:
-                with open(sessions_file, 'rb') as f:
-                    self.sessions = pickle.load(f)
-                print(f"Loaded {len(self.sessions)} sessions")
-            except Exception as e:
-                print(f"Error loading sessions: {e}")
-                self.sessions = {}
-        else:
+        try:
+            self.sessions = load_sessions()
+            print(f"Loaded {len(self.sessions)} sessions")
+        except Exception as e:
+            print(f"Error loading sessions: {e}")
             self.sessions = {}
 
     def handle_init_map(self):
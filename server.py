@@ -5,27 +5,31 @@ Provides map interface for mission configuration and state management.
 """
 
 import asyncio
-import base64
+import concurrent.futures
+import functools
 import glob
 import io
 import json
 import logging
 import os
-import requests
+import re
 import shutil
-import time
 import uuid
 import zipfile
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+import aiohttp
+import orjson
 import yaml
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from src.device.http_utils import base64
+
 # Add device src to path
 import sys
 device_src_path = str(Path(__file__).parent / 'src')
@@ -38,11 +42,218 @@ sys.path.insert(0, str(Path(__file__).parent / 'src' / 'general'))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Drone Device Server", description="Global UAV Localization Device Interface")
+# AWS server endpoints, resolved once so every call site agrees on the host
+AWS_WS_URL = os.getenv("AWS_WS_URL", "ws://localhost:5000")
+AWS_HTTP_URL = AWS_WS_URL.replace("ws://", "http://").replace("wss://", "https://")
+
+app = FastAPI(
+    title="Drone Device Server",
+    description="Global UAV Localization Device Interface",
+    default_response_class=ORJSONResponse  # orjson encodes the polled progress dicts much faster than stdlib json
+)
+
+class ProgressStore(dict):
+    """Progress entries keyed by operation, with a version bumped on every change.
+
+    Entries assigned as plain dicts are wrapped so that in-place edits
+    (item assignment, update, |=) bump the version as well.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.version = 0
+    
+    def touch(self):
+        self.version += 1
+    
+    def __setitem__(self, key, value):
+        if isinstance(value, dict) and not isinstance(value, ProgressEntry):
+            value = ProgressEntry(self, value)
+        super().__setitem__(key, value)
+        self.touch()
+    
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.touch()
+    
+    def pop(self, *args):
+        value = super().pop(*args)
+        self.touch()
+        return value
+
+
+class ProgressEntry(dict):
+    """Progress dict of a single operation; changes are reported to its store."""
+    
+    def __init__(self, store: ProgressStore, data: Dict[str, Any]):
+        super().__init__(data)
+        self._store = store
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._store.touch()
+    
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._store.touch()
+    
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
 
 # Global state for tracking async tasks
 active_tasks = {}
-progress_data = {}
+progress_data = ProgressStore()
+
+# Encoded /api/progress body, reused until progress_data.version changes
+_progress_cache = (-1, b"")
+# Distinguishes ETags issued by different server runs
+_PROGRESS_EPOCH = uuid.uuid4().hex[:8]
+
+# Trailing-edge window for coalescing bursts of server progress updates (~20 Hz)
+PROGRESS_DEBOUNCE_SECONDS = 0.05
+TERMINAL_STATUSES = ("complete", "completed", "error")
+
+# Directories the server writes to; created once at startup
+DATA_DIRECTORIES = ("data", "data/maps", "data/embeddings", "logs")
+
+# Session IDs issued by the AWS server are 8 alphanumeric characters
+SESSION_RE = re.compile(r"[A-Za-z0-9]{8}")
+
+
+def _spawn(key: str, coro) -> asyncio.Task:
+    """Start a background task registered under key; it unregisters itself when done."""
+    task = asyncio.create_task(coro)
+    active_tasks[key] = task
+
+    def _unregister(done_task: asyncio.Task):
+        # A replacement task may already own the key if this one was cancelled
+        if active_tasks.get(key) is done_task:
+            del active_tasks[key]
+
+    task.add_done_callback(_unregister)
+    return task
+
+
+def _session_paths(session_id: str) -> tuple:
+    """Return the (map, embeddings) file paths for a session as plain strings."""
+    return f"data/maps/{session_id}.png", f"data/embeddings/{session_id}.json"
+
+
+def _extract_zip_atomic(zip_ref: zipfile.ZipFile, dest_dir: str):
+    """Extract all members so each file only appears at its final path once fully written."""
+    tmp_suffix = f".tmp.{os.getpid()}"
+    for info in zip_ref.infolist():
+        if info.is_dir():
+            continue
+        name = Path(info.filename)
+        if name.is_absolute() or '..' in name.parts:
+            logger.warning(f"⚠ Skipping unsafe zip member: {info.filename}")
+            continue
+        
+        dst = os.path.join(dest_dir, info.filename)
+        dst_tmp = dst + tmp_suffix
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            with zip_ref.open(info) as src, open(dst_tmp, 'wb') as dst_file:
+                shutil.copyfileobj(src, dst_file, 1024 * 1024)
+                dst_file.flush()
+                os.fsync(dst_file.fileno())
+            # rename is atomic within a filesystem
+            os.replace(dst_tmp, dst)
+        except BaseException:
+            if os.path.exists(dst_tmp):
+                os.remove(dst_tmp)
+            raise
+
+
+def _extract_zip_file(zip_path: str, dest_dir: str):
+    """Extract a zip archive on disk with _extract_zip_atomic."""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        _extract_zip_atomic(zip_ref, dest_dir)
+
+
+def _extract_zip_b64(zip_b64: str, dest_dir: str):
+    """Decode a base64 zip in memory and extract it with _extract_zip_atomic."""
+    # The decoded bytes back the ZipFile directly; nothing is staged on disk
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(zip_b64, validate=False)), 'r') as zip_ref:
+        _extract_zip_atomic(zip_ref, dest_dir)
+
+
+async def _run_extraction(func, *args):
+    """
+    Run a blocking extraction on a worker thread.
+    
+    Cancelling the caller cannot stop the thread, so on cancellation this
+    waits for the worker to finish writing (or remove its own *.tmp.*
+    files) before re-raising.
+    """
+    worker = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(worker)
+    except asyncio.CancelledError:
+        await asyncio.wait([worker])
+        raise
+
+
+async def _extract_mission_result(result: Dict[str, Any]) -> bool:
+    """
+    Extract the archive of a websocket init_map result into data/.
+    
+    Handles inline zip_data and a zip_path downloaded by the client, which
+    is always removed afterwards. Returns False if the result has neither.
+    """
+    if result.get('zip_data'):
+        # Small file - decode base64 zip data straight into an in-memory zip
+        logger.info("📦 Processing zip_data directly")
+        await _run_extraction(_extract_zip_b64, result['zip_data'], "data")
+    elif result.get('zip_path'):
+        # Large file - already streamed to disk by the client
+        zip_path = result['zip_path']
+        logger.info(f"📦 Extracting downloaded mission file: {zip_path}")
+        try:
+            await _run_extraction(_extract_zip_file, zip_path, "data")
+        finally:
+            os.remove(zip_path)
+    else:
+        return False
+    
+    logger.info(f"✅ Extracted mission data from zip")
+    return True
+
+
+def _pid_alive(pid: int) -> bool:
+    """Return True if a process with this PID is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, just owned by another user
+    return True
+
+
+def _sweep_partial_files() -> list:
+    """
+    Remove temp files orphaned by processes that died mid-extraction.
+    
+    Writers name temp files *.tmp.<pid> and remove them on failure, so a
+    temp file whose process is still running (including this one) is a
+    live write and is left alone.
+    """
+    removed = []
+    for file_path in glob.glob("data/**/*.tmp.*", recursive=True):
+        pid = file_path.rsplit(".", 1)[-1]
+        if pid.isdigit() and _pid_alive(int(pid)):
+            continue
+        try:
+            os.remove(file_path)
+            removed.append(file_path)
+            logger.info(f"🧹 Removed partial file: {file_path}")
+        except OSError as e:
+            logger.warning(f"⚠ Could not remove partial file {file_path}: {e}")
+    return removed
 
 
 class InitMapRequest(BaseModel):
@@ -112,6 +323,31 @@ class StateManager:
 state_manager = StateManager()
 
 
+@app.on_event("startup")
+async def startup():
+    """Create output directories, the shared HTTP client and the fetch worker pool."""
+    for directory in DATA_DIRECTORIES:
+        os.makedirs(directory, exist_ok=True)
+    
+    # One pooled session keeps connections alive across downloads and health probes
+    app.state.http = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=30),
+        connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60)
+    )
+    # Blocking session fetches get their own small pool so a burst of them
+    # cannot starve the default executor
+    app.state.fetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="fetch")
+    # Extractions interrupted by a crash leave only *.tmp.* files behind
+    _sweep_partial_files()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the shared HTTP client and worker pool."""
+    await app.state.http.close()
+    app.state.fetch_pool.shutdown(wait=False, cancel_futures=True)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def get_index():
     """Serve the main HTML interface."""
@@ -1858,9 +2094,7 @@ async def init_map(request: InitMapRequest, background_tasks: BackgroundTasks):
     
     # Start new background task
     task_id = str(uuid.uuid4())
-    active_tasks['init_map'] = asyncio.create_task(
-        _init_map_background(request.lat, request.lng, request.km, task_id)
-    )
+    _spawn('init_map', _init_map_background(request.lat, request.lng, request.km, task_id))
     
     # Set initial progress immediately so UI doesn't see 'idle'
     progress_data['init_map'] = {
@@ -1887,37 +2121,28 @@ async def process_mission_data(request: ProcessMissionDataRequest):
     try:
         logger.info(f"📦 Processing mission data for session {request.session_id}")
         
-        # Decode base64 zip data
-        zip_bytes = base64.b64decode(request.zip_data)
-        
-        # Extract zip contents
-        with zipfile.ZipFile(io.BytesIO(zip_bytes), 'r') as zip_ref:
-            # Create data directories
-            os.makedirs("data/maps", exist_ok=True)
-            os.makedirs("data/embeddings", exist_ok=True)
-            
-            # Extract all files to the data directory
-            zip_ref.extractall("data/")
-            logger.info(f"✅ Extracted mission data from zip")
-            
-            # Move files to correct subdirectories
-            import shutil
-            
-            # Move map files to maps subdirectory
-            for filename in os.listdir("data/"):
-                if filename.endswith(('.png', '.jpg', '.jpeg')) and filename.startswith('map'):
-                    src = os.path.join("data", filename)
-                    dst = os.path.join("data/maps", filename)
-                    shutil.move(src, dst)
-                    logger.info(f"📁 Moved {filename} to maps/")
-            
-            # Move embeddings files to embeddings subdirectory
-            for filename in os.listdir("data/"):
-                if filename.endswith(('.json', '.pkl', '.npy')) and 'embedding' in filename.lower():
-                    src = os.path.join("data", filename)
-                    dst = os.path.join("data/embeddings", filename)
-                    shutil.move(src, dst)
-                    logger.info(f"📁 Moved {filename} to embeddings/")
+        # Decode and extract all files to the data directory off the event loop
+        await asyncio.to_thread(_extract_zip_b64, request.zip_data, "data")
+        logger.info(f"✅ Extracted mission data from zip")
+        
+        # Move files to correct subdirectories
+        import shutil
+        
+        # Move map files to maps subdirectory
+        for filename in os.listdir("data/"):
+            if filename.endswith(('.png', '.jpg', '.jpeg')) and filename.startswith('map'):
+                src = os.path.join("data", filename)
+                dst = os.path.join("data/maps", filename)
+                shutil.move(src, dst)
+                logger.info(f"📁 Moved {filename} to maps/")
+        
+        # Move embeddings files to embeddings subdirectory
+        for filename in os.listdir("data/"):
+            if filename.endswith(('.json', '.pkl', '.npy')) and 'embedding' in filename.lower():
+                src = os.path.join("data", filename)
+                dst = os.path.join("data/embeddings", filename)
+                shutil.move(src, dst)
+                logger.info(f"📁 Moved {filename} to embeddings/")
         
         # Update state by merging with existing values when None
         current = state_manager.load_state()
@@ -1948,9 +2173,7 @@ async def send_logs(background_tasks: BackgroundTasks):
     
     # Start new background task
     task_id = str(uuid.uuid4())
-    active_tasks['send_logs'] = asyncio.create_task(
-        _send_logs_background(task_id)
-    )
+    _spawn('send_logs', _send_logs_background(task_id))
     
     return {"status": "started", "task_id": task_id}
 
@@ -2044,10 +2267,11 @@ async def clear_state():
                 shutil.rmtree(subdir_path)
                 subdir_path.mkdir(parents=True, exist_ok=True)
         
-        # Remove sessions file
-        sessions_file = data_dir / "sessions.pkl"
-        if sessions_file.exists():
-            sessions_file.unlink()
+        # Remove the session catalog (SQLite db with its WAL files) and any legacy pickle
+        for name in ["sessions.db", "sessions.db-wal", "sessions.db-shm", "sessions.pkl"]:
+            sessions_file = data_dir / name
+            if sessions_file.exists():
+                sessions_file.unlink()
         
         return {"status": "success", "message": "State cleared"}
     
@@ -2067,9 +2291,7 @@ async def start_discovery(background_tasks: BackgroundTasks):
     
     # Start new discovery task
     task_id = str(uuid.uuid4())
-    active_tasks['discovery'] = asyncio.create_task(
-        _discovery_background(task_id)
-    )
+    _spawn('discovery', _discovery_background(task_id))
     
     return {"status": "discovery_started", "task_id": task_id}
 
@@ -2089,10 +2311,9 @@ async def stop_discovery():
     session_id = current_state.get('session_id')
     
     if session_id:
-        map_file = Path(f"data/maps/{session_id}.png")
-        embeddings_file = Path(f"data/embeddings/{session_id}.json")
+        map_file, embeddings_file = _session_paths(session_id)
         
-        if not (map_file.exists() and embeddings_file.exists()):
+        if not (os.path.exists(map_file) and os.path.exists(embeddings_file)):
             # Session ID exists but no data files - reset to empty
             state_manager.update_state(session_id='')
     # Clear discovery progress
@@ -2217,30 +2438,9 @@ async def abort_websocket():
 async def cleanup_partial_files():
     """Clean up any partial files from cancelled operations."""
     try:
-        import os
-        import glob
-        
-        cleaned_files = []
-        
-        # Check for partial map files (less than 1KB might be incomplete)
-        maps_pattern = "data/maps/*.png"
-        for file_path in glob.glob(maps_pattern):
-            if os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-                if file_size < 1024:  # Less than 1KB, likely partial
-                    os.remove(file_path)
-                    cleaned_files.append(file_path)
-                    logger.info(f"🧹 Cleaned partial map file: {file_path}")
-        
-        # Check for partial embedding files (less than 100 bytes might be incomplete)
-        embeddings_pattern = "data/embeddings/*.json"
-        for file_path in glob.glob(embeddings_pattern):
-            if os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-                if file_size < 100:  # Less than 100 bytes, likely partial
-                    os.remove(file_path)
-                    cleaned_files.append(file_path)
-                    logger.info(f"🧹 Cleaned partial embeddings file: {file_path}")
+        # Extraction writes to *.tmp.* and renames into place, so only those can be partial;
+        # the sweep skips temp files of writers that are still running
+        cleaned_files = _sweep_partial_files()
         
         logger.info(f"🧹 Quick cleanup completed: {len(cleaned_files)} files removed")
         return {"status": "success", "files_cleaned": len(cleaned_files), "files": cleaned_files}
@@ -2258,16 +2458,16 @@ async def fetch_session(request: Request):
         session_id = body.get('session_id', '').strip()
         
         # Validate session ID format
-        if not session_id or len(session_id) != 8 or not session_id.isalnum():
+        if not SESSION_RE.fullmatch(session_id):
             raise HTTPException(status_code=400, detail="Invalid session ID format")
         
         # Start the fetch operation in background
-        global active_tasks
-        task = asyncio.create_task(_fetch_session_background(session_id))
-        active_tasks[f'fetch_session_{session_id}'] = task
+        _spawn(f'fetch_session_{session_id}', _fetch_session_background(session_id))
         
         return {"status": "started", "session_id": session_id}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in fetch_session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2292,23 +2492,24 @@ async def update_progress_endpoint(progress_update: dict):
     return {"success": True, "message": "Progress updated"}
 
 
-@app.get("/api/progress")
-async def get_progress():
-    """Get current operation progress."""
-    global progress_data
+def _select_progress() -> Dict[str, Any]:
+    """Pick the progress entry the UI should display."""
+    # One shallow copy so the lookups below can't race with background tasks deleting entries
+    snap = progress_data.copy()
     
     # Check for discovery progress first
-    if 'discovery' in progress_data:
-        return progress_data['discovery']
+    if 'discovery' in snap:
+        return snap['discovery']
     
     # Then check for other operations
-    for operation in ['fetch_session', 'init_map', 'send_logs']:
-        if operation in progress_data:
-            return progress_data[operation]
+    for operation in ('fetch_session', 'init_map', 'send_logs'):
+        entry = snap.get(operation)
+        if entry is not None:
+            return entry
     
     # Return latest progress data or idle state
-    if progress_data:
-        latest = list(progress_data.values())[-1]
+    if snap:
+        latest = next(reversed(snap.values()))
         # Ensure it's a dict, not a string
         if isinstance(latest, str):
             return {"status": "complete", "progress": 100, "message": latest}
@@ -2317,6 +2518,26 @@ async def get_progress():
     return {"status": "idle", "progress": 0, "message": ""}
 
 
+@app.get("/api/progress")
+async def get_progress(request: Request):
+    """Get current operation progress."""
+    global _progress_cache
+    
+    version = progress_data.version
+    etag = f'"{_PROGRESS_EPOCH}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    # Nothing changed since the client's last poll
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    # Encode once per change rather than once per poll
+    if _progress_cache[0] != version:
+        _progress_cache = (version, orjson.dumps(_select_progress()))
+    
+    return Response(content=_progress_cache[1], media_type="application/json", headers=headers)
+
+
 async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
     """Clean background task for map initialization with real-time WebSocket progress."""
     global progress_data
@@ -2340,22 +2561,47 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
             "total_embeddings": 0
         }
         
+        # Progress updates are sparse deltas, debounced: deltas arriving within one
+        # window are merged and applied together
+        loop = asyncio.get_running_loop()
+        pending_update = None
+        flush_handle = None
+        
+        def apply_progress(progress_update: Dict[str, Any]):
+            """Merge a progress delta into the init_map progress entry."""
+            current = progress_data.get('init_map')
+            if current is None or current.get("task_id") != task_id:
+                # Entry was finalized, cancelled or replaced - drop stale updates
+                return
+            
+            # Only changed fields are sent; full dicts from older servers merge the same way
+            current |= {key: value for key, value in progress_update.items() if value is not None}
+            logger.info(f"📊 Progress: {current.get('progress', 0)}% - {current.get('message', '')}")
+        
+        def flush_progress():
+            """Apply the most recent buffered progress update."""
+            nonlocal pending_update, flush_handle
+            flush_handle = None
+            if pending_update is not None:
+                update, pending_update = pending_update, None
+                apply_progress(update)
+        
         # Define clean progress callback
         async def update_progress(progress_update: Dict[str, Any]):
             """Clean progress callback that updates device UI directly."""
-            logger.info(f"📊 Progress: {progress_update.get('progress', 0)}% - {progress_update.get('message', '')}")
-            
-            # Update global progress with structured data
-            progress_data['init_map'].update({
-                "status": progress_update.get("status", "running"),
-                "progress": progress_update.get("progress", 0),
-                "message": progress_update.get("message", "Processing..."),
-                "phase": progress_update.get("phase", "unknown"),
-                "tiles_completed": progress_update.get("tiles_completed", 0),
-                "total_tiles": progress_update.get("total_tiles", 0),
-                "embeddings_processed": progress_update.get("embeddings_processed", 0),
-                "total_embeddings": progress_update.get("total_embeddings", 0)
-            })
+            nonlocal pending_update, flush_handle
+            if pending_update is None:
+                pending_update = dict(progress_update)
+            else:
+                pending_update |= progress_update
+            
+            if progress_update.get("status") in TERMINAL_STATUSES:
+                # Never delay the final state
+                if flush_handle is not None:
+                    flush_handle.cancel()
+                flush_progress()
+            elif flush_handle is None:
+                flush_handle = loop.call_later(PROGRESS_DEBOUNCE_SECONDS, flush_progress)
         
         # Execute init_map with clean WebSocket client
         logger.info(f"🚀 Starting mission: {lat}, {lng}, {km}km")
@@ -2369,8 +2615,9 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
                 lat=lat, 
                 lng=lng, 
                 meters=int(km * 1000),
-                server_url="ws://localhost:5000",
-                progress_callback=update_progress
+                server_url=AWS_WS_URL,
+                progress_callback=update_progress,
+                http=app.state.http
                 )
             
             logger.info(f"✅ Server call completed: success={result.get('success')}")
@@ -2378,41 +2625,7 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
             # Process mission data if present
             if result.get('success'):
                 try:
-                    zip_bytes = None
-                    
-                    if result.get('zip_data'):
-                        # Small file - decode base64 zip data directly
-                        logger.info("📦 Processing zip_data directly")
-                        zip_bytes = base64.b64decode(result['zip_data'])
-                        
-                    elif result.get('download_url'):
-                        # Large file - download from URL
-                        download_url = result['download_url']
-                        # Use localhost:5000 for the download since that's where our AWS server is running
-                        server_base = "http://localhost:5000"
-                        full_url = f"{server_base}{download_url}"
-                        
-                        logger.info(f"📥 Downloading large mission file from: {full_url}")
-                        
-                        import requests
-                        response = requests.get(full_url, timeout=30)
-                        if response.status_code == 200:
-                            zip_bytes = response.content
-                            logger.info(f"✅ Downloaded {len(zip_bytes)} bytes")
-                        else:
-                            raise Exception(f"Download failed with status {response.status_code}")
-                    
-                    # Extract zip contents if we have data
-                    if zip_bytes:
-                        with zipfile.ZipFile(io.BytesIO(zip_bytes), 'r') as zip_ref:
-                            # Create data directories
-                            os.makedirs("data/maps", exist_ok=True)
-                            os.makedirs("data/embeddings", exist_ok=True)
-                            
-                            # Extract all files to the data directory
-                            zip_ref.extractall("data/")
-                            logger.info(f"✅ Extracted mission data from zip")
-                    else:
+                    if not await _extract_mission_result(result):
                         logger.warning("⚠️ No mission data to process")
                         
                 except Exception as e:
@@ -2428,16 +2641,16 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
             session_id = result.get('session_id', '')
             
             # Verify that all data was actually stored successfully
-            map_file = Path(f"data/maps/{session_id}.png")
-            embeddings_file = Path(f"data/embeddings/{session_id}.json")
+            map_file, embeddings_file = _session_paths(session_id)
         else:
             # WebSocket failed, but AWS might have completed processing
             # Try to find a recent session for these coordinates
             logger.warning("⚠️ WebSocket failed, checking for completed session on server...")
             try:
                 # Make a simple HTTP request to get recent sessions
-                response = requests.get(f"{os.getenv('AWS_WS_URL', 'ws://localhost:5000').replace('ws://', 'http://')}/health", timeout=5)
-                if response.status_code == 200:
+                async with app.state.http.get(f"{AWS_HTTP_URL}/health", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    health_ok = response.status == 200
+                if health_ok:
                     # Find most recent session file
                     recent_sessions = sorted(glob.glob("data/embeddings/*.json"), key=lambda x: os.path.getmtime(x), reverse=True)
                     if recent_sessions:
@@ -2446,10 +2659,9 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
                         session_id = os.path.basename(session_file).replace('.json', '')
                         logger.info(f"📁 Found recent session: {session_id}")
                         
-                        map_file = Path(f"data/maps/{session_id}.png")
-                        embeddings_file = Path(f"data/embeddings/{session_id}.json")
+                        map_file, embeddings_file = _session_paths(session_id)
                         
-                        if map_file.exists() and embeddings_file.exists():
+                        if os.path.exists(map_file) and os.path.exists(embeddings_file):
                             result = {"success": True, "session_id": session_id}
                             logger.info(f"✅ Using completed session: {session_id}")
             except Exception as e:
@@ -2459,28 +2671,27 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
             if not result.get('success'):
                 logger.error(f"❌ No valid session found")
                 session_id = ''  # Ensure session_id is always defined
-                map_file = Path("")
-                embeddings_file = Path("")
+                map_file = embeddings_file = ""
             
             # If files are missing but we have a session_id, attempt a fetch-only fallback
-            if session_id and (not map_file.exists() or not embeddings_file.exists()):
+            if session_id and not (os.path.exists(map_file) and os.path.exists(embeddings_file)):
                 try:
                     # Fallback fetch using WebSocket client
                     fallback = await call_server_init_map_websocket(
                         lat=lat,
                         lng=lng,
                         meters=int(km * 1000),
-                        server_url=os.getenv("AWS_WS_URL", "ws://ec2-16-171-238-14.eu-north-1.compute.amazonaws.com:5000"),
+                        server_url=AWS_WS_URL,
                         session_id=session_id,
-                        progress_callback=update_progress
+                        progress_callback=update_progress,
+                        http=app.state.http
                     )
-                    # Recompute file paths after fallback
-                    map_file = Path(f"data/maps/{session_id}.png")
-                    embeddings_file = Path(f"data/embeddings/{session_id}.json")
+                    if fallback.get('success'):
+                        await _extract_mission_result(fallback)
                 except Exception as _:
                     pass
 
-            if map_file.exists() and embeddings_file.exists():
+            if os.path.exists(map_file) and os.path.exists(embeddings_file):
                 # TRANSACTION COMMIT: Update all state atomically
                 state_manager.update_state(
                     lat=lat,
@@ -2501,8 +2712,6 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
                 await asyncio.sleep(3.0)  # Give frontend time to detect completion and hide progress
                 if 'init_map' in progress_data:
                     del progress_data['init_map']
-                if task_id in active_tasks:
-                    del active_tasks[task_id]
                     
             else:
                 # Data verification failed - clean up partial files and rollback
@@ -2511,11 +2720,11 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
                 
                 # Clean up any partial files
                 try:
-                    if map_file.exists():
-                        map_file.unlink()
+                    if os.path.exists(map_file):
+                        os.unlink(map_file)
                         logger.info(f"✓ Removed partial map file: {map_file}")
-                    if embeddings_file.exists():
-                        embeddings_file.unlink()
+                    if os.path.exists(embeddings_file):
+                        os.unlink(embeddings_file)
                         logger.info(f"✓ Removed partial embeddings file: {embeddings_file}")
                 except Exception as cleanup_error:
                     logger.warning(f"⚠ Error during cleanup: {cleanup_error}")
@@ -2531,8 +2740,6 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
                 await asyncio.sleep(3.0)
                 if 'init_map' in progress_data and progress_data['init_map'].get("status") == "error":
                     del progress_data['init_map']
-                if task_id in active_tasks:
-                    del active_tasks[task_id]
                 
     
     except asyncio.CancelledError:
@@ -2549,21 +2756,7 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
                 for temp_file in data_dir.glob("*_temp.zip"):
                     temp_file.unlink()
                     logger.info(f"✓ Removed temp file: {temp_file}")
-                
-                # Clean up any partial session files (we don't know the session_id yet)
-                # This is a safety cleanup for any partial files
-                import time
-                current_time = time.time()
-                for maps_dir in (data_dir / "maps").glob("*.png"):
-                    # Remove files created in the last 5 minutes that might be partial
-                    if current_time - maps_dir.stat().st_mtime < 300:  # 5 minutes
-                        logger.info(f"⚠ Removing recent map file (might be partial): {maps_dir}")
-                        maps_dir.unlink()
-                
-                for emb_dir in (data_dir / "embeddings").glob("*.json"):
-                    if current_time - emb_dir.stat().st_mtime < 300:  # 5 minutes
-                        logger.info(f"⚠ Removing recent embeddings file (might be partial): {emb_dir}")
-                        emb_dir.unlink()
+                # *.tmp.* files are removed by their own writers, which may still be running
         except Exception as cleanup_error:
             logger.warning(f"⚠ Error during cancellation cleanup: {cleanup_error}")
         
@@ -2578,10 +2771,6 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
         await asyncio.sleep(1)
         if 'init_map' in progress_data:
             del progress_data['init_map']
-        
-        # Clean up task
-        if task_id in active_tasks:
-            del active_tasks[task_id]
     
     except Exception as e:
         # TRANSACTION ROLLBACK: Unexpected error, restore original state
@@ -2594,10 +2783,6 @@ async def _init_map_background(lat: float, lng: float, km: float, task_id: str):
             "progress": 0,
             "message": f"Error: {str(e)}"
         }
-        
-        # Clean up task
-        if task_id in active_tasks:
-            del active_tasks[task_id]
 
 
 async def _discovery_background(task_id: str):
@@ -2664,10 +2849,9 @@ async def _discovery_background(task_id: str):
             
             # Check if we have actual map/embedding files for this session
             if session_id:
-                map_file = Path(f"data/maps/{session_id}.png")
-                embeddings_file = Path(f"data/embeddings/{session_id}.json")
+                map_file, embeddings_file = _session_paths(session_id)
                 
-                if not (map_file.exists() and embeddings_file.exists()):
+                if not (os.path.exists(map_file) and os.path.exists(embeddings_file)):
                     # Session ID exists but no data files - reset to empty
                     state_manager.update_state(session_id='')
             
@@ -2689,10 +2873,9 @@ async def _discovery_background(task_id: str):
         session_id = current_state.get('session_id')
         
         if session_id:
-            map_file = Path(f"data/maps/{session_id}.png")
-            embeddings_file = Path(f"data/embeddings/{session_id}.json")
+            map_file, embeddings_file = _session_paths(session_id)
             
-            if not (map_file.exists() and embeddings_file.exists()):
+            if not (os.path.exists(map_file) and os.path.exists(embeddings_file)):
                 state_manager.update_state(session_id='')
         
         if 'discovery' in progress_data:
@@ -2805,7 +2988,7 @@ async def _fetch_session_background(session_id: str):
         }
         
         # Import the wrapper function
-        # HTTP polling wrapper removed - using WebSocket client only
+        from src.device.init_map_wrapper import call_server_init_map
         
         # Try to fetch using existing session
         try:
@@ -2816,19 +2999,16 @@ async def _fetch_session_background(session_id: str):
             progress_data['fetch_session']['message'] = "Connecting to server..."
             progress_data['fetch_session']['progress'] = 20
             
-            # Call the synchronous function in an executor to avoid blocking
-            import asyncio
-            import functools
-            
-            loop = asyncio.get_event_loop()
+            # Call the synchronous function on the dedicated fetch pool to avoid blocking
+            loop = asyncio.get_running_loop()
             result = await loop.run_in_executor(
-                None, 
+                app.state.fetch_pool,
                 functools.partial(
                     call_server_init_map,
                     lat=lat, 
                     lng=lng, 
                     meters=km,
-                    server_url="http://ec2-16-171-238-14.eu-north-1.compute.amazonaws.com:5000", 
+                    server_url=AWS_HTTP_URL,
                     session_id=session_id
                 )
                 )
@@ -2902,22 +3082,11 @@ async def _fetch_session_background(session_id: str):
             "progress": 0,
             "message": f"Error: {str(e)}"
         }
-    
-    finally:
-        # Clean up active task
-        global active_tasks
-        task_key = f'fetch_session_{session_id}'
-        if task_key in active_tasks:
-            del active_tasks[task_key]
 
 
 if __name__ == "__main__":
     import uvicorn
     
-    # Create necessary directories
-    for directory in ["data", "data/maps", "data/embeddings", "logs"]:
-        Path(directory).mkdir(parents=True, exist_ok=True)
-    
     print("Starting Drone Device Server...")
     print("Access the web interface at: http://localhost:8888")
     
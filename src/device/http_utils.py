@@ -0,0 +1,35 @@
+"""
+Device HTTP Helpers
+===================
+Decoders and progress-stream parsing shared by the init_map wrappers,
+the WebSocket client and the device server.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict
+
+import aiohttp
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:  # orjson is optional on the device; stdlib parses bytes too
+    json_loads = json.loads
+
+try:
+    import pybase64 as base64  # SIMD decoder, same API as the stdlib module
+except ImportError:
+    import base64
+
+__all__ = ["base64", "json_loads", "progress_events"]
+
+
+async def progress_events(response: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the progress objects of a server progress stream (NDJSON or SSE)."""
+    async for raw_line in response.content:
+        line = raw_line.strip()
+        if line.startswith(b"data:"):
+            line = line[5:].strip()
+        elif not line.startswith(b"{"):
+            continue  # Blank separators, SSE comments and event names
+        yield json_loads(line)
@@ -4,27 +4,70 @@ Device Init Map Wrapper
 Calls the server init_map endpoint and downloads/unpacks zip files.
 """
 
-import requests
-import json
-import pickle
+import aiohttp
+import asyncio
+import concurrent.futures
+import io
+import logging
 import os
+import random
+import shutil
+import tarfile
+import tempfile
+import threading
 import zipfile
 import time
+import uuid
+from contextlib import aclosing, contextmanager
 from pathlib import Path
-from typing import Dict, Any, Optional
-from PIL import Image
-import numpy as np
+from typing import Dict, Any, Iterator, Optional, BinaryIO, Tuple, Union
 
+from .http_utils import base64, json_loads as _json_loads, progress_events
+from .session_store import register_session
+
+try:
+    import zstandard
+except ImportError:  # Only needed when the server sends .tar.zst archives
+    zstandard = None
+
+logger = logging.getLogger(__name__)
 
 # Global variable to store current task info for cancellation
 _current_task = {}
+_task_lock = threading.Lock()
 
-def call_server_init_map(lat: float, lng: float, meters: int = 1000, 
-                        server_url: str = "http://localhost:5000", 
-                        session_id: Optional[str] = None) -> Dict[str, Any]:
+# init_map calls in progress, so identical concurrent requests share one server task
+_inflight: Dict[tuple, concurrent.futures.Future] = {}
+_inflight_lock = threading.Lock()
+
+# Pooled keep-alive HTTP session per event loop, reused across calls until
+# close_http_session() is awaited on that loop. A plain dict: each session
+# references its loop, so weak keys would never be dropped anyway.
+_http_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+DATA_DIR = Path("data")
+MAPS_DIR = DATA_DIR / "maps"
+EMBEDDINGS_DIR = DATA_DIR / "embeddings"
+
+# Downloaded archives stay in memory up to this size, then spill to a temp file
+ZIP_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Poll fallback backs off while progress stands still
+POLL_MIN_INTERVAL = 0.25
+POLL_MAX_INTERVAL = 15.0
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+async def call_server_init_map_async(lat: float, lng: float, meters: int = 1000, 
+                                     server_url: str = "http://localhost:5000", 
+                                     session_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Call server init_map endpoint and store results locally.
     
+    The HTTP session is pooled on the calling event loop and kept open for
+    later calls; await close_http_session() on that loop before it ends
+    (call_server_init_map does this for you).
+    
     Args:
         lat: Latitude coordinate
         lng: Longitude coordinate  
@@ -35,6 +78,36 @@ def call_server_init_map(lat: float, lng: float, meters: int = 1000,
     Returns:
         Dict with success status and session_id
     """
+    key = (round(lat, 5), round(lng, 5), meters, server_url, session_id)
+    with _inflight_lock:
+        inflight = _inflight.get(key)
+        if inflight is None:
+            inflight = _inflight[key] = concurrent.futures.Future()
+            is_leader = True
+        else:
+            is_leader = False
+    
+    if not is_leader:
+        print(f"Joining in-flight init_map request for {key}")
+        # Shielded: a cancelled follower must not cancel the result shared with everyone else
+        return await asyncio.shield(asyncio.wrap_future(inflight))
+    
+    # A running future can no longer be cancelled by anyone
+    inflight.set_running_or_notify_cancel()
+    result = {"success": False, "error": "init_map request was interrupted"}
+    try:
+        result = await _call_server_init_map(lat, lng, meters, server_url, session_id)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        if not inflight.done():
+            inflight.set_result(result)
+
+
+async def _call_server_init_map(lat: float, lng: float, meters: int,
+                                server_url: str, session_id: Optional[str]) -> Dict[str, Any]:
+    """Run one init_map request against the server and follow it to completion."""
     try:
         print(f"Calling server init_map at {server_url}/init_map")
         if session_id:
@@ -44,7 +117,6 @@ def call_server_init_map(lat: float, lng: float, meters: int = 1000,
         
         # Call server init_map with mode=device_async for cancellable background processing
         # Note: Server expects form data, not JSON
-        import uuid
         connection_id = str(uuid.uuid4())
         
         form_data = {
@@ -56,74 +128,67 @@ def call_server_init_map(lat: float, lng: float, meters: int = 1000,
         }
         if session_id:
             form_data["session_id"] = session_id
+        
+        # Pooled session for the init request, every progress poll and a possible cancel
+        http = _get_http()
+        async with http.post(f"{server_url}/init_map", data=form_data) as response:
+            response.raise_for_status()
+            print(f"Server response status: {response.status}")
             
-        response = requests.post(f"{server_url}/init_map", data=form_data, timeout=(30, 3600))  # 30s connect, 1 hour read for large areas
+            # Parse the async response to get task_id
+            try:
+                async_response = _json_loads(await response.read())
+            except ValueError as e:
+                return {"success": False, "error": f"Invalid JSON response: {e}"}
         
-        response.raise_for_status()
-        print(f"Server response status: {response.status_code}")
+        task_id = async_response.get("task_id")
+        if not task_id:
+            return {"success": False, "error": "No task_id in response"}
         
-        # Parse the async response to get task_id
-        try:
-            async_response = response.json()
-            task_id = async_response.get("task_id")
-            if not task_id:
-                return {"success": False, "error": "No task_id in response"}
-            
-            print(f"Got task_id: {task_id}")
-            
-            # Store task info globally for potential cancellation
-            global _current_task
-            _current_task = {
+        print(f"Got task_id: {task_id}")
+        
+        # Store task info globally for potential cancellation
+        with _task_lock:
+            _current_task.clear()
+            _current_task.update({
                 "task_id": task_id,
                 "connection_id": connection_id,
-                "server_url": server_url
-            }
-            
-            # Poll for progress until completion
-            while True:
-                time.sleep(1)  # Poll every second
-                
-                try:
-                    progress_response = requests.get(f"{server_url}/progress/{task_id}", timeout=60)  # 1 minute for progress polling
-                    progress_response.raise_for_status()
-                    progress_data = progress_response.json()
-                    
-                    # AWS server now forwards progress updates directly to device UI
-                    # No need to duplicate forwarding here
-                    
-                    print(f"Progress: {progress_data.get('progress', 0)}% - {progress_data.get('message', '')}")
-                    
-                    if progress_data.get("status") == "completed":
-                        # Clear task info
-                        _current_task.clear()
-                        # Task completed successfully
-                        if progress_data.get("zip_data"):
-                            # Decode base64 zip data and unpack
-                            import base64
-                            zip_data = base64.b64decode(progress_data["zip_data"])
-                            session_id = progress_data.get("session_id", f"session_{int(time.time())}")
-                            return _download_and_unpack_zip(zip_data, session_id)
-                        else:
-                            return {"success": True, "session_id": progress_data.get("session_id"), "message": "Task completed"}
-                    
-                    elif progress_data.get("status") == "failed":
-                        _current_task.clear()
-                        return {"success": False, "error": progress_data.get("error", "Task failed")}
-                    
-                    elif progress_data.get("status") == "cancelled":
-                        _current_task.clear()
+                "server_url": server_url,
+                "http": http,
+                "loop": asyncio.get_running_loop()
+            })
+        
+        try:
+            # Follow progress until completion
+            last_logged = None
+            async with aclosing(_progress_updates(http, server_url, task_id)) as updates:
+                async for progress_data in updates:
+                    # Only log when the percentage or status actually moves
+                    state = (progress_data.get("progress", 0), progress_data.get("status"))
+                    if state != last_logged:
+                        logger.debug("Progress: %s%% - %s", state[0], progress_data.get("message", ""))
+                        last_logged = state
+                    # Stop before acting on anything that arrives after an abort request
+                    with _task_lock:
+                        aborting = _current_task.get("aborting")
+                    if aborting:
+                        print(f"Task {task_id} aborted, ignoring further progress")
                         return {"success": False, "error": "Task was cancelled"}
-                    
-                    # Continue polling if status is "running"
-                    
-                except requests.RequestException as e:
-                    print(f"Error polling progress: {e}")
-                    return {"success": False, "error": f"Progress polling failed: {e}"}
-                    
+                    result = await _handle_progress(http, server_url, progress_data)
+                    if result is not None:
+                        return result
+            return {"success": False, "error": "Progress stream ended before the task finished"}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error polling progress: {e}")
+            return {"success": False, "error": f"Progress polling failed: {e}"}
         except ValueError as e:
             return {"success": False, "error": f"Invalid JSON response: {e}"}
-        
-    except requests.exceptions.RequestException as e:
+        finally:
+            # Clear task info
+            with _task_lock:
+                _current_task.clear()
+    
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"Network error calling server: {e}")
         return {"success": False, "error": f"Network error: {str(e)}"}
     except Exception as e:
@@ -131,62 +196,234 @@ def call_server_init_map(lat: float, lng: float, meters: int = 1000,
         return {"success": False, "error": f"Error: {str(e)}"}
 
 
-def _download_and_unpack_zip(zip_data: bytes, session_id: str) -> Dict[str, Any]:
-    """Download and unpack zip file to local storage."""
-    try:
-        # Create directories
-        data_dir = Path("data")
-        maps_dir = data_dir / "maps"
-        embeddings_dir = data_dir / "embeddings"
-        
-        for dir_path in [data_dir, maps_dir, embeddings_dir]:
-            dir_path.mkdir(parents=True, exist_ok=True)
-        
-        # Save zip temporarily
-        zip_path = data_dir / f"{session_id}_temp.zip"
-        with open(zip_path, 'wb') as f:
-            f.write(zip_data)
-        
-        # Extract zip contents
-        with zipfile.ZipFile(zip_path, 'r') as zf:
-            # Extract map.png
-            if 'map.png' in zf.namelist():
-                map_data = zf.read('map.png')
-                map_file_path = maps_dir / f"{session_id}.png"
-                with open(map_file_path, 'wb') as f:
-                    f.write(map_data)
-                print(f"Saved map to {map_file_path}")
-            
-            # Extract embeddings.json
-            if 'embeddings.json' in zf.namelist():
-                embeddings_data = zf.read('embeddings.json')
-                embeddings_file_path = embeddings_dir / f"{session_id}.json"
-                with open(embeddings_file_path, 'wb') as f:
-                    f.write(embeddings_data)
-                print(f"Saved embeddings to {embeddings_file_path}")
+def _get_http() -> aiohttp.ClientSession:
+    """Return the pooled HTTP session for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    # Loops that ended without closing their session cannot close it any more - drop them
+    for dead_loop in [other for other in _http_sessions if other.is_closed()]:
+        logger.warning("HTTP session of a closed event loop was never closed")
+        del _http_sessions[dead_loop]
+    
+    http = _http_sessions.get(loop)
+    if http is None or http.closed:
+        timeout = aiohttp.ClientTimeout(connect=30, total=3600)  # 30s connect, 1 hour for large areas
+        connector = aiohttp.TCPConnector(limit=8, limit_per_host=4, keepalive_timeout=60)
+        http = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        _http_sessions[loop] = http
+    return http
+
+
+async def close_http_session():
+    """Close the pooled HTTP session of the running event loop, if any."""
+    http = _http_sessions.pop(asyncio.get_running_loop(), None)
+    if http is not None:
+        await http.close()
+
+
+async def _progress_updates(http: aiohttp.ClientSession, server_url: str, task_id: str):
+    """
+    Yield progress dicts for a server task.
+    
+    Uses the server's progress stream (NDJSON or SSE, one object per status
+    change) when available, and falls back to polling with backoff on 404.
+    """
+    async with http.get(f"{server_url}/progress/{task_id}/stream") as response:
+        if response.status != 404:
+            response.raise_for_status()
+            async for progress_data in progress_events(response):
+                yield progress_data
+            return
+    
+    # Older server without a stream endpoint
+    delay = POLL_MIN_INTERVAL
+    last_progress = -1
+    while True:
+        await asyncio.sleep(delay)
         
-        # Clean up temp zip
-        zip_path.unlink()
+        # 1 minute for progress polling
+        async with http.get(f"{server_url}/progress/{task_id}",
+                            timeout=aiohttp.ClientTimeout(total=60)) as progress_response:
+            progress_response.raise_for_status()
+            progress_data = _json_loads(await progress_response.read())
         
-        # Update sessions.pkl with lightweight metadata
-        sessions_file = data_dir / "sessions.pkl"
-        sessions = {}
-        if sessions_file.exists():
+        # Poll quickly while the task moves, back off (with jitter) while it stalls
+        progress = progress_data.get("progress") or 0
+        if progress > last_progress:
+            last_progress = progress
+            delay = POLL_MIN_INTERVAL
+        else:
+            delay = min(delay * 1.6, POLL_MAX_INTERVAL) + random.uniform(0, 0.1)
+        yield progress_data
+
+
+async def _handle_progress(http: aiohttp.ClientSession, server_url: str,
+                           progress_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the final result once progress_data reports a finished task, else None."""
+    # AWS server now forwards progress updates directly to device UI
+    # No need to duplicate forwarding here
+    
+    if progress_data.get("status") == "completed":
+        # Task completed successfully
+        if progress_data.get("map_url") and progress_data.get("embeddings_url"):
+            # Server exposes map and embeddings separately - fetch both at once
+            session_id = progress_data.get("session_id", f"session_{int(time.time())}")
+            return await _fetch_split(http, _absolute_url(server_url, progress_data["map_url"]),
+                                      _absolute_url(server_url, progress_data["embeddings_url"]),
+                                      session_id)
+        elif progress_data.get("zip_url"):
+            # Archive served as a raw download - stream it instead of decoding base64
+            zip_url = _absolute_url(server_url, progress_data["zip_url"])
+            session_id = progress_data.get("session_id", f"session_{int(time.time())}")
+            with await _download_zip(http, zip_url) as zip_file:
+                return await asyncio.to_thread(_download_and_unpack_zip, zip_file, session_id)
+        elif progress_data.get("zip_data"):
+            # Decode base64 zip data and unpack, off the event loop
+            session_id = progress_data.get("session_id", f"session_{int(time.time())}")
+            return await asyncio.to_thread(_decode_and_unpack_zip, progress_data["zip_data"], session_id)
+        else:
+            return {"success": True, "session_id": progress_data.get("session_id"), "message": "Task completed"}
+    
+    elif progress_data.get("status") == "failed":
+        return {"success": False, "error": progress_data.get("error", "Task failed")}
+    
+    elif progress_data.get("status") == "cancelled":
+        return {"success": False, "error": "Task was cancelled"}
+    
+    # Keep following progress if status is "running"
+    return None
+
+
+def _absolute_url(server_url: str, url: str) -> str:
+    """Resolve a server-relative download path against server_url."""
+    if url.startswith(("http://", "https://")):
+        return url
+    return f"{server_url}{url}"
+
+
+async def _fetch_split(http: aiohttp.ClientSession, map_url: str, embeddings_url: str,
+                       session_id: str) -> Dict[str, Any]:
+    """
+    Download map and embeddings concurrently and register the session.
+    
+    Both files are staged and only replace the session's files once both
+    downloads succeed; a failed re-fetch leaves an earlier download intact.
+    """
+    targets = _session_file_paths(session_id)
+    urls = {"map.png": map_url, "embeddings.json": embeddings_url}
+    try:
+        with _staged_files(targets) as staged:
+            downloads = [asyncio.ensure_future(_download_file(http, url, staged[name]))
+                         for name, url in urls.items()]
             try:
-                with open(sessions_file, 'rb') as f:
-                    sessions = pickle.load(f)
-            except:
-                sessions = {}
+                await asyncio.gather(*downloads)
+            except BaseException:
+                # gather leaves the sibling running - stop it before its staged file is removed
+                for download in downloads:
+                    download.cancel()
+                await asyncio.gather(*downloads, return_exceptions=True)
+                raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Error downloading session files: {e}")
+        return {"success": False, "error": f"Download failed: {e}"}
+    
+    for name, url in urls.items():
+        print(f"Saved {url} to {targets[name]}")
+    register_session(session_id, str(targets["map.png"]), str(targets["embeddings.json"]))
+    
+    print(f"Session {session_id} stored successfully")
+    return {
+        "success": True,
+        "session_id": session_id,
+        "message": "Map downloaded and cached locally"
+    }
+
+
+async def _download_file(http: aiohttp.ClientSession, url: str, file_path: Path):
+    """Stream url into file_path."""
+    async with http.get(url) as response:
+        response.raise_for_status()
+        with _synced_file(file_path) as dst:
+            async for chunk in response.content.iter_chunked(COPY_CHUNK_BYTES):
+                dst.write(chunk)
+
+
+async def _download_zip(http: aiohttp.ClientSession, zip_url: str) -> BinaryIO:
+    """Stream a zip archive into a temp file, rewound and ready to read."""
+    # Let the server pick zstd-compressed tar when we can unpack it
+    accept = "application/zstd, application/zip" if zstandard else "application/zip"
+    async with http.get(zip_url, headers={"Accept": accept}) as response:
+        response.raise_for_status()
+        if (response.content_length or 0) > ZIP_SPOOL_MAX_BYTES:
+            # Too large to keep in memory - write straight to disk
+            archive = tempfile.TemporaryFile()
+        else:
+            archive = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_BYTES)
+        try:
+            async for chunk in response.content.iter_chunked(COPY_CHUNK_BYTES):
+                archive.write(chunk)
+        except BaseException:
+            archive.close()
+            raise
+    
+    archive.seek(0)
+    print(f"Downloaded zip from {zip_url}")
+    return archive
+
+
+def call_server_init_map(lat: float, lng: float, meters: int = 1000, 
+                        server_url: str = "http://localhost:5000", 
+                        session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Blocking version of call_server_init_map_async for threads without an event loop."""
+    async def run():
+        try:
+            return await call_server_init_map_async(lat, lng, meters, server_url, session_id)
+        finally:
+            # The loop ends with this call, so its pooled session goes with it
+            await close_http_session()
+    
+    return asyncio.run(run())
+
+
+def _session_file_paths(session_id: str) -> Dict[str, Path]:
+    """Return where each archive member of a session is stored."""
+    return {
+        "map.png": MAPS_DIR / f"{session_id}.png",
+        "embeddings.json": EMBEDDINGS_DIR / f"{session_id}.json"
+    }
+
+
+def _decode_and_unpack_zip(zip_b64: str, session_id: str) -> Dict[str, Any]:
+    """Decode a base64 zip and unpack it to local storage."""
+    return _download_and_unpack_zip(base64.b64decode(zip_b64, validate=False), session_id)
+
+
+def _download_and_unpack_zip(zip_data: Union[bytes, BinaryIO], session_id: str) -> Dict[str, Any]:
+    """
+    Unpack a map archive (raw bytes or a readable binary file) to local storage.
+    
+    Handles the classic ZIP archive and, when the server sends one, a
+    zstd-compressed tar (detected from the zstd frame magic).
+    """
+    try:
+        targets = _session_file_paths(session_id)
         
-        # Store lightweight session metadata
-        sessions[session_id] = {
-            "created_at": time.time(),
-            "map_path": str(map_file_path),
-            "embeddings_path": str(embeddings_file_path)
-        }
+        if isinstance(zip_data, bytes):
+            # ZipFile reads file objects directly - no temp zip on disk
+            zip_data = io.BytesIO(zip_data)
+        
+        magic = zip_data.read(4)
+        zip_data.seek(0)
+        # Nothing replaces the session's files unless every member unpacked
+        with _staged_files(targets) as staged:
+            if magic == ZSTD_MAGIC:
+                _unpack_tar_zst(zip_data, staged)
+            else:
+                _unpack_zip(zip_data, staged)
+        for name, file_path in targets.items():
+            print(f"Saved {name} to {file_path}")
         
-        with open(sessions_file, 'wb') as f:
-            pickle.dump(sessions, f)
+        # Register lightweight session metadata in the session catalog
+        register_session(session_id, str(targets["map.png"]), str(targets["embeddings.json"]))
         
         print(f"Session {session_id} stored successfully")
         return {
@@ -200,56 +437,186 @@ def _download_and_unpack_zip(zip_data: bytes, session_id: str) -> Dict[str, Any]
         return {"success": False, "error": f"Failed to unpack zip: {e}"}
 
 
+def _unpack_zip(zip_file: BinaryIO, targets: Dict[str, Path]):
+    """Extract the target members of a ZIP archive, streaming each one to disk."""
+    with zipfile.ZipFile(zip_file, 'r') as zf:
+        missing = set(targets) - set(zf.namelist())
+        if missing:
+            raise ValueError(f"Archive is missing {', '.join(sorted(missing))}")
+        for name, file_path in targets.items():
+            # zf.open streams the member and checks its CRC-32 as it goes
+            with zf.open(name) as src, _synced_file(file_path) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_BYTES)
+
+
+def _unpack_tar_zst(archive: BinaryIO, targets: Dict[str, Path]):
+    """Extract the target members of a .tar.zst archive in a single streaming pass."""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to unpack .tar.zst archives")
+    
+    with zstandard.ZstdDecompressor().stream_reader(archive) as reader, \
+            tarfile.open(fileobj=reader, mode="r|") as tf:
+        remaining = dict(targets)
+        for member in tf:
+            file_path = remaining.pop(os.path.normpath(member.name), None) if member.isfile() else None
+            if file_path is None:
+                continue
+            with tf.extractfile(member) as src, _synced_file(file_path) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_BYTES)
+    # A stream can't be checked up front - only once it has been read through
+    if remaining:
+        raise ValueError(f"Archive is missing {', '.join(remaining)}")
+
+
+@contextmanager
+def _staged_files(targets: Dict[str, Path]) -> Iterator[Dict[str, Path]]:
+    """
+    Stage replacements for targets and move them into place together.
+    
+    Yields a temp path next to each target, unique to this call. When the
+    block succeeds every staged file replaces its target; when it fails
+    only the staged files are removed.
+    """
+    # Staged next to the target: a tmpfs stage would make the rename cross-device
+    suffix = f".{uuid.uuid4().hex[:8]}.tmp.{os.getpid()}"
+    staged = {name: file_path.with_name(file_path.name + suffix) for name, file_path in targets.items()}
+    try:
+        yield staged
+        for name, tmp_path in staged.items():
+            # rename is atomic within a filesystem
+            os.replace(tmp_path, targets[name])
+    except BaseException:
+        for tmp_path in staged.values():
+            tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def _synced_file(file_path: Path) -> Iterator[BinaryIO]:
+    """Open file_path for writing and fsync it once the block completes."""
+    try:
+        dst = open(file_path, 'wb')
+    except FileNotFoundError:
+        # Directories are only created when missing, not checked on every write
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        dst = open(file_path, 'wb')
+    with dst:
+        yield dst
+        dst.flush()
+        os.fsync(dst.fileno())
+
+
+async def _post_cancel(http: aiohttp.ClientSession, cancel_url: str,
+                       task_id: str, connection_id: str) -> int:
+    """POST a cancel request and return the HTTP status."""
+    async with http.post(cancel_url, json={
+        "task_id": task_id,
+        "connection_id": connection_id
+    }, timeout=aiohttp.ClientTimeout(total=30)) as response:
+        return response.status
+
+
 def abort_current_task() -> Dict[str, Any]:
     """
     Abort the currently running task by simulating connection loss.
+    Blocks until the cancel request is answered, so the polling call's own
+    event loop must use abort_current_task_async instead.
     Returns status of the abort operation.
     """
-    global _current_task
+    with _task_lock:
+        task_loop = _current_task.get("loop")
+    try:
+        on_task_loop = task_loop is not None and asyncio.get_running_loop() is task_loop
+    except RuntimeError:
+        on_task_loop = False
+    if on_task_loop:
+        # Waiting here would freeze the loop that has to send the cancel request
+        return {"success": False, "error": "Abort from the task's event loop must await abort_current_task_async()"}
     
-    if not _current_task:
-        return {"success": False, "message": "No active task to abort"}
+    task, result = _start_abort()
+    if result is not None:
+        return result
     
     try:
-        task_id = _current_task.get("task_id")
-        connection_id = _current_task.get("connection_id") 
-        server_url = _current_task.get("server_url")
-        
-        print(f"🚫 Aborting task {task_id} with connection {connection_id}")
-        
-        # For HTTP-based cancellation, we can mark the connection as disconnected
-        # This will trigger the AWS server's task cancellation for this connection_id
-        
-        # Since there's no direct HTTP endpoint for connection disconnect,
-        # we'll manually set the task status to cancelled by calling the progress endpoint
-        # and then simulating what the disconnect handler would do
-        
-        # Method 1: Try to find a cancel endpoint
+        # The request goes through the polling call's session, on that call's event loop
+        future = asyncio.run_coroutine_threadsafe(_post_task_cancel(task), task["loop"])
         try:
-            cancel_url = f"{server_url}/cancel_task"
-            response = requests.post(cancel_url, json={
-                "task_id": task_id,
-                "connection_id": connection_id
-            }, timeout=30)  # 30 seconds for cancel requests
-            
-            if response.status_code == 200:
-                print(f"✅ Task {task_id} cancellation requested via cancel endpoint")
-                _current_task.clear()
-                return {"success": True, "message": f"Task {task_id} cancelled"}
-        except:
-            pass  # Endpoint might not exist, try alternative
-        
-        # Method 2: Simulate connection loss by triggering background task detection
-        # Since we can't directly disconnect HTTP, we'll rely on task status checking
-        print(f"⚠️ No direct cancel endpoint found, marking task for cancellation")
-        _current_task.clear()
-        return {"success": True, "message": "Task abort requested - cancellation will be detected on next poll"}
-            
+            status = future.result(timeout=30)  # 30 seconds for cancel requests
+        except (aiohttp.ClientError, asyncio.TimeoutError, concurrent.futures.TimeoutError, RuntimeError) as e:
+            print(f"⚠️ Cancel endpoint unavailable: {e}")  # Try alternative
+            status = None
+        return _finish_abort(task, status)
     except Exception as e:
         print(f"❌ Error aborting task: {e}")
         return {"success": False, "error": f"Abort failed: {str(e)}"}
 
 
+async def abort_current_task_async() -> Dict[str, Any]:
+    """Awaitable abort_current_task; safe on any event loop, including the polling call's."""
+    task, result = _start_abort()
+    if result is not None:
+        return result
+    
+    try:
+        try:
+            if task["loop"] is asyncio.get_running_loop():
+                status = await _post_task_cancel(task)
+            else:
+                future = asyncio.run_coroutine_threadsafe(_post_task_cancel(task), task["loop"])
+                status = await asyncio.wait_for(asyncio.wrap_future(future), timeout=30)
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as e:
+            print(f"⚠️ Cancel endpoint unavailable: {e}")  # Try alternative
+            status = None
+        return _finish_abort(task, status)
+    except Exception as e:
+        print(f"❌ Error aborting task: {e}")
+        return {"success": False, "error": f"Abort failed: {str(e)}"}
+
+
+def _start_abort() -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Mark the current task as aborting; also return a result when there is nothing to cancel."""
+    with _task_lock:
+        task = dict(_current_task)
+        if task and not task.get("aborting"):
+            # The polling call stops at its next update and clears the task info itself
+            _current_task["aborting"] = True
+    
+    if not task:
+        return task, {"success": False, "message": "No active task to abort"}
+    if task.get("aborting"):
+        return task, {"success": True, "message": f"Task {task.get('task_id')} is already being cancelled"}
+    
+    print(f"🚫 Aborting task {task.get('task_id')} with connection {task.get('connection_id')}")
+    return task, None
+
+
+def _post_task_cancel(task: Dict[str, Any]):
+    """Cancel request for task, to run on the task's own event loop."""
+    # For HTTP-based cancellation, we can mark the connection as disconnected
+    # This will trigger the AWS server's task cancellation for this connection_id
+    return _post_cancel(task["http"], f"{task['server_url']}/cancel_task",
+                        task["task_id"], task["connection_id"])
+
+
+def _finish_abort(task: Dict[str, Any], status: Optional[int]) -> Dict[str, Any]:
+    """Report an abort given the cancel endpoint's HTTP status (None if it was unreachable)."""
+    task_id = task.get("task_id")
+    if status == 200:
+        print(f"✅ Task {task_id} cancellation requested via cancel endpoint")
+        return {"success": True, "message": f"Task {task_id} cancelled"}
+    if status is not None:
+        print(f"⚠️ Cancel endpoint returned {status}")
+    
+    # Method 2: Simulate connection loss by triggering background task detection
+    # The local call is already marked as aborting and stops at its next update
+    print(f"⚠️ No direct cancel endpoint found, marking task for cancellation")
+    return {"success": True, "message": "Task abort requested - cancellation will be detected on next poll"}
+
+
 def get_current_task_info() -> Dict[str, Any]:
     """Get information about the currently running task."""
-    return _current_task.copy()
+    with _task_lock:
+        if _current_task.get("aborting"):
+            return {}
+        return {key: _current_task[key] for key in ("task_id", "connection_id", "server_url")
+                if key in _current_task}
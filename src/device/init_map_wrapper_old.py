@@ -4,18 +4,38 @@ Device Init Map Wrapper
 Calls the server init_map endpoint and downloads/unpacks zip files.
 """
 
-import requests
+import aiohttp
 import json
-import pickle
 import os
+import shutil
+import tempfile
 import zipfile
 import time
 import asyncio
+import concurrent.futures
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, BinaryIO
 from PIL import Image
 import numpy as np
 
+from .http_utils import base64, json_loads as _json_loads, progress_events
+from .init_map_wrapper import _get_http
+from .session_store import register_session
+
+DATA_DIR = Path("data")
+MAPS_DIR = DATA_DIR / "maps"
+EMBEDDINGS_DIR = DATA_DIR / "embeddings"
+
+# Base64 is decoded in slices of this many characters
+B64_CHUNK_CHARS = 4 * 65536
+# Archive bodies the fallback device mode can stream straight into a zip spool
+ARCHIVE_CONTENT_TYPES = ('application/zip', 'application/base64')
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+# Downloaded zips stay in memory up to this size, then spill to a temp file
+ZIP_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
+# Zip members are extracted side by side; zlib releases the GIL while inflating
+_extract_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="unzip")
 
 async def call_server_init_map(lat: float, lng: float, meters: int = 1000, 
                                server_url: str = "http://localhost:5000", 
@@ -35,6 +55,14 @@ async def call_server_init_map(lat: float, lng: float, meters: int = 1000,
     Returns:
         Dict with success status and session_id
     """
+    # Shares init_map_wrapper's pooled session, so it is closed by close_http_session() there
+    return await _call_server_init_map(_get_http(), lat, lng, meters, server_url, session_id, progress_callback)
+
+
+async def _call_server_init_map(http: aiohttp.ClientSession, lat: float, lng: float, meters: int,
+                                server_url: str, session_id: Optional[str],
+                                progress_callback: Optional[callable]) -> Dict[str, Any]:
+    """Run one init_map request over http and store the result locally."""
     try:
         if progress_callback:
             progress_callback("Initializing connection...", 5)
@@ -50,16 +78,15 @@ async def call_server_init_map(lat: float, lng: float, meters: int = 1000,
         
         # Try async mode first (new server)
         try:
-            response = requests.post(f"{server_url}/init_map", json={
+            async with http.post(f"{server_url}/init_map", json={
                 "lat": lat,
                 "lng": lng,
                 "meters": meters,
                 "mode": "device_async",  # Request async mode for progress tracking
                 "session_id": session_id
-            }, timeout=(30, 120))  # 30s connection, 120s read for large areas
-            
-            response.raise_for_status()
-            result = response.json()
+            }, timeout=aiohttp.ClientTimeout(connect=30, sock_read=120)) as response:  # 30s connection, 120s read for large areas
+                response.raise_for_status()
+                result = _json_loads(await response.read())
             
             # Check if we got a task_id for polling
             if result.get("task_id"):
@@ -68,10 +95,10 @@ async def call_server_init_map(lat: float, lng: float, meters: int = 1000,
                 print(f"Server supports async mode. Got task_id: {task_id}, polling for progress...")
                 
                 # Poll for progress updates
-                final_result = await _poll_server_progress(server_url, task_id, progress_callback)
+                final_result = await _poll_server_progress(http, server_url, task_id, progress_callback)
                 return final_result
                 
-        except (requests.exceptions.RequestException, KeyError) as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as e:
             print(f"Async mode failed ({e}), falling back to device mode...")
             # Fallback to regular device mode
             
@@ -81,54 +108,61 @@ async def call_server_init_map(lat: float, lng: float, meters: int = 1000,
         
 
             
-        response = requests.post(f"{server_url}/init_map", json={
+        async with http.post(f"{server_url}/init_map", json={
             "lat": lat,
             "lng": lng,
             "meters": meters,
             "mode": "device",  # Fallback to regular device mode
             "session_id": session_id
-        }, timeout=(30, 180))  # 30s connection, 180s read for fallback mode
+        }, headers={"Accept": "application/zip, application/base64, application/json"},
+        timeout=aiohttp.ClientTimeout(connect=30, sock_read=180)) as response:  # 30s connection, 180s read for fallback mode
+            response.raise_for_status()
+            
+            # Check if response is a zip file (old server style) or its raw base64
+            if response.content_type in ARCHIVE_CONTENT_TYPES:
+                if progress_callback:
+                    progress_callback("Downloading map data...", 40)
+                
+                # Extract session_id from filename header
+                content_disposition = response.headers.get('content-disposition', '')
+                if 'session_' in content_disposition:
+                    session_id_from_header = content_disposition.split('session_')[1].split('.')[0]
+                else:
+                    session_id_from_header = f"session_{int(time.time())}"
+                
+                # Stream the zip into a spool, then unpack it
+                zip_file = _new_zip_spool()
+                if response.content_type == 'application/base64':
+                    await _stream_b64_response_to_file(response, zip_file)
+                else:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                        zip_file.write(chunk)
+            else:
+                # JSON response
+                result = _json_loads(await response.read())
         
-        response.raise_for_status()
+        if response.content_type in ARCHIVE_CONTENT_TYPES:
+            final_result = await _unpack_in_thread(zip_file, session_id_from_header, progress_callback)
+            return final_result
         
-        # Check if response is a zip file (old server style)
-        if response.headers.get('content-type') == 'application/zip':
+        if result.get("zip_data"):
+            # Base64 encoded zip data response
             if progress_callback:
-                progress_callback("Downloading map data...", 40)
+                progress_callback("Processing satellite data...", 40)
             
-            # Extract session_id from filename header
-            content_disposition = response.headers.get('content-disposition', '')
-            if 'session_' in content_disposition:
-                session_id_from_header = content_disposition.split('session_')[1].split('.')[0]
-            else:
-                session_id_from_header = f"session_{int(time.time())}"
+            session_id_received = result.get("session_id", f"session_{int(time.time())}")
+            zip_file = _new_zip_spool()
+            await asyncio.to_thread(_stream_b64_to_file, result["zip_data"], zip_file)
             
-            # Download and unpack zip
-            final_result = _download_and_unpack_zip(response.content, session_id_from_header, progress_callback)
+            # Unpack zip
+            final_result = await _unpack_in_thread(zip_file, session_id_received, progress_callback)
             return final_result
             
         else:
-            # JSON response
-            result = response.json()
-            
-            if result.get("zip_data"):
-                # Base64 encoded zip data response
-                if progress_callback:
-                    progress_callback("Processing satellite data...", 40)
-                
-                import base64
-                zip_data = base64.b64decode(result["zip_data"])
-                session_id_received = result.get("session_id", f"session_{int(time.time())}")
-                
-                # Download and unpack zip
-                final_result = _download_and_unpack_zip(zip_data, session_id_received, progress_callback)
-                return final_result
-                
-            else:
-                # Error or other response
-                return result
+            # Error or other response
+            return result
         
-    except requests.exceptions.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"Network error calling server: {e}")
         return {"success": False, "error": f"Network error: {str(e)}"}
     except Exception as e:
@@ -136,11 +170,16 @@ async def call_server_init_map(lat: float, lng: float, meters: int = 1000,
         return {"success": False, "error": f"Error: {str(e)}"}
 
 
-async def _poll_server_progress(server_url: str, task_id: str, progress_callback: Optional[callable] = None) -> Dict[str, Any]:
+async def _poll_server_progress(http: aiohttp.ClientSession, server_url: str, task_id: str,
+                                progress_callback: Optional[callable] = None) -> Dict[str, Any]:
     """
-    Poll the server for progress updates on a long-running task.
+    Follow progress updates on a long-running task.
+    
+    Reads the server's progress event stream when it has one, and falls back
+    to polling once per second on 404.
     
     Args:
+        http: Session whose kept-alive connection serves every poll
         server_url: Base server URL
         task_id: Task ID to poll for
         progress_callback: Callback for progress updates
@@ -149,6 +188,20 @@ async def _poll_server_progress(server_url: str, task_id: str, progress_callback
         Final result when task completes
     """
     try:
+        # One long-lived request instead of a round trip per second
+        try:
+            async with http.get(f"{server_url}/progress/{task_id}/stream",
+                                timeout=aiohttp.ClientTimeout(connect=30, total=3600)) as response:
+                if response.status != 404:
+                    response.raise_for_status()
+                    async for progress_data in progress_events(response):
+                        result = await _handle_progress_update(progress_data, progress_callback, "Stream")
+                        if result is not None:
+                            return result
+                    return {"success": False, "error": "Progress stream ended before the task finished"}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Progress stream failed ({e}), falling back to polling...")
+        
         max_polls = 120  # 2 minutes max polling
         poll_interval = 1  # Poll every second
         
@@ -157,47 +210,18 @@ async def _poll_server_progress(server_url: str, task_id: str, progress_callback
             
             try:
                 # Poll progress endpoint
-                response = requests.get(f"{server_url}/progress/{task_id}", timeout=60)  # 60s timeout for progress polls
-                response.raise_for_status()
-                progress_data = response.json()
+                async with http.get(f"{server_url}/progress/{task_id}",
+                                    timeout=aiohttp.ClientTimeout(total=60)) as response:  # 60s timeout for progress polls
+                    response.raise_for_status()
+                    progress_data = _json_loads(await response.read())
                 
-                status = progress_data.get("status", "unknown")
-                progress = progress_data.get("progress", 0)
-                message = progress_data.get("message", "Processing...")
+                result = await _handle_progress_update(progress_data, progress_callback, f"Poll {poll_count + 1}")
+                if result is not None:
+                    return result
                 
-                # Update progress
-                if progress_callback and message and progress:
-                    progress_callback(message, progress)
-                
-                print(f"Poll {poll_count + 1}: {status} - {progress}% - {message}")
-                
-                if status == "completed":
-                    # Task completed successfully
-                    if progress_data.get("zip_data"):
-                        # Got zip data, process it
-                        import base64
-                        zip_data = base64.b64decode(progress_data["zip_data"])
-                        session_id = progress_data.get("session_id", f"session_{int(time.time())}")
-                        
-                        if progress_callback:
-                            progress_callback("Compressing map data...", 85)
-                        
-                        return _download_and_unpack_zip(zip_data, session_id, progress_callback)
-                    else:
-                        return {
-                            "success": True,
-                            "session_id": progress_data.get("session_id"),
-                            "message": "Task completed successfully"
-                        }
-                        
-                elif status == "failed" or status == "error":
-                    # Task failed
-                    error_msg = progress_data.get("error", "Unknown error")
-                    return {"success": False, "error": error_msg}
-                    
                 # Continue polling for in_progress, queued, etc.
                 
-            except requests.exceptions.RequestException as e:
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 print(f"Error polling progress: {e}")
                 # Continue polling unless it's a persistent error
                 if poll_count > 5:  # Give it a few retries
@@ -211,77 +235,136 @@ async def _poll_server_progress(server_url: str, task_id: str, progress_callback
         return {"success": False, "error": f"Progress polling error: {e}"}
 
 
-def _download_and_unpack_zip(zip_data: bytes, session_id: str, progress_callback: Optional[callable] = None) -> Dict[str, Any]:
-    """Download and unpack zip file to local storage."""
+async def _handle_progress_update(progress_data: Dict[str, Any], progress_callback: Optional[callable],
+                            label: str) -> Optional[Dict[str, Any]]:
+    """Report one progress update; return the final result once the task has finished."""
+    status = progress_data.get("status", "unknown")
+    progress = progress_data.get("progress", 0)
+    message = progress_data.get("message", "Processing...")
+    
+    # Update progress
+    if progress_callback and message and progress:
+        progress_callback(message, progress)
+    
+    print(f"{label}: {status} - {progress}% - {message}")
+    
+    if status == "completed":
+        # Task completed successfully
+        if progress_data.get("zip_data"):
+            # Got zip data, process it
+            session_id = progress_data.get("session_id", f"session_{int(time.time())}")
+            zip_file = _new_zip_spool()
+            await asyncio.to_thread(_stream_b64_to_file, progress_data["zip_data"], zip_file)
+            
+            if progress_callback:
+                progress_callback("Compressing map data...", 85)
+            
+            return await _unpack_in_thread(zip_file, session_id, progress_callback)
+        else:
+            return {
+                "success": True,
+                "session_id": progress_data.get("session_id"),
+                "message": "Task completed successfully"
+            }
+            
+    elif status == "failed" or status == "error":
+        # Task failed
+        error_msg = progress_data.get("error", "Unknown error")
+        return {"success": False, "error": error_msg}
+    
+    return None
+
+
+async def _unpack_in_thread(zip_file: BinaryIO, session_id: str,
+                            progress_callback: Optional[callable] = None) -> Dict[str, Any]:
+    """Run _download_and_unpack_zip on a worker thread so the event loop stays responsive."""
+    if progress_callback:
+        # Progress reports from the worker are delivered on this loop, in order
+        loop = asyncio.get_running_loop()
+        callback = progress_callback
+        progress_callback = lambda message, progress: loop.call_soon_threadsafe(callback, message, progress)
+    return await asyncio.to_thread(_download_and_unpack_zip, zip_file, session_id, progress_callback)
+
+
+def _new_zip_spool() -> tempfile.SpooledTemporaryFile:
+    """Return a buffer for a downloaded zip that only touches the disk for very large zips."""
+    return tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_BYTES)
+
+
+def _decode_b64_chunk(pending: bytes, chunk: bytes, f: BinaryIO) -> bytes:
+    """Decode the whole 4-character groups of pending + chunk into f and return the rest."""
+    # Line breaks would throw off the 4-character alignment
+    pending += chunk.translate(None, b" \t\r\n")
+    aligned = len(pending) - len(pending) % 4
+    f.write(base64.b64decode(pending[:aligned], validate=False))
+    return pending[aligned:]
+
+
+def _stream_b64_to_file(b64_str: str, f: BinaryIO):
+    """Decode a base64 string into f slice by slice, never holding the whole decoded blob."""
+    pending = b""
+    for start in range(0, len(b64_str), B64_CHUNK_CHARS):
+        pending = _decode_b64_chunk(pending, b64_str[start:start + B64_CHUNK_CHARS].encode("ascii"), f)
+    if pending:
+        f.write(base64.b64decode(pending, validate=False))
+
+
+async def _stream_b64_response_to_file(response: aiohttp.ClientResponse, f: BinaryIO):
+    """Decode a raw base64 body into f as it arrives, so decoding overlaps the download."""
+    pending = b""
+    async for chunk in response.content.iter_chunked(B64_CHUNK_CHARS):
+        pending = _decode_b64_chunk(pending, chunk, f)
+    if pending:
+        f.write(base64.b64decode(pending, validate=False))
+
+
+def _extract_member(zf: zipfile.ZipFile, name: str, file_path: Path):
+    """Stream one zip member to file_path; raises KeyError if the archive lacks it."""
+    # ZipFile serializes reads of its underlying file, so members can be opened from separate threads
+    info = zf.getinfo(name)
+    with zf.open(info) as src, open(file_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_BYTES)
+
+
+def _download_and_unpack_zip(zip_file: BinaryIO, session_id: str, progress_callback: Optional[callable] = None) -> Dict[str, Any]:
+    """Unpack a downloaded zip (any readable binary file) to local storage, then close it."""
     try:
         if progress_callback:
             progress_callback("Preparing storage...", 50)
         
-        # Create directories
-        data_dir = Path("data")
-        maps_dir = data_dir / "maps"
-        embeddings_dir = data_dir / "embeddings"
-        
-        for dir_path in [data_dir, maps_dir, embeddings_dir]:
-            dir_path.mkdir(parents=True, exist_ok=True)
+        # Create directories (makedirs creates data/ along the way)
+        os.makedirs(MAPS_DIR, exist_ok=True)
+        os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
         
         if progress_callback:
             progress_callback("Saving data package...", 60)
         
-        # Save zip temporarily
-        zip_path = data_dir / f"{session_id}_temp.zip"
-        with open(zip_path, 'wb') as f:
-            f.write(zip_data)
-        
         if progress_callback:
             progress_callback("Extracting satellite images...", 70)
         
-        # Extract zip contents
-        with zipfile.ZipFile(zip_path, 'r') as zf:
-            # Extract map.png
-            if 'map.png' in zf.namelist():
-                map_data = zf.read('map.png')
-                map_file_path = maps_dir / f"{session_id}.png"
-                with open(map_file_path, 'wb') as f:
-                    f.write(map_data)
-                print(f"Saved map to {map_file_path}")
+        # Extract zip contents, streaming each member at a fixed buffer size
+        map_file_path = MAPS_DIR / f"{session_id}.png"
+        embeddings_file_path = EMBEDDINGS_DIR / f"{session_id}.json"
+        zip_file.seek(0)
+        with zipfile.ZipFile(zip_file, 'r') as zf:
+            map_job = _extract_pool.submit(_extract_member, zf, 'map.png', map_file_path)
+            embeddings_job = _extract_pool.submit(_extract_member, zf, 'embeddings.json', embeddings_file_path)
             
-            # Extract embeddings.json
-            if 'embeddings.json' in zf.namelist():
-                embeddings_data = zf.read('embeddings.json')
-                embeddings_file_path = embeddings_dir / f"{session_id}.json"
-                with open(embeddings_file_path, 'wb') as f:
-                    f.write(embeddings_data)
-                print(f"Saved embeddings to {embeddings_file_path}")
+            # Wait for both before the zip is closed
+            concurrent.futures.wait([map_job, embeddings_job])
+            map_job.result()
+            print(f"Saved map to {map_file_path}")
+            embeddings_job.result()
+            print(f"Saved embeddings to {embeddings_file_path}")
         
         if progress_callback:
             progress_callback("Finalizing installation...", 90)
         
-        # Clean up temp zip
-        zip_path.unlink()
-        
         if progress_callback:
             progress_callback("Completing setup...", 95)
         
-        # Update sessions.pkl with lightweight metadata
-        sessions_file = data_dir / "sessions.pkl"
-        sessions = {}
-        if sessions_file.exists():
-            try:
-                with open(sessions_file, 'rb') as f:
-                    sessions = pickle.load(f)
-            except:
-                sessions = {}
-        
-        # Store lightweight session metadata
-        sessions[session_id] = {
-            "created_at": time.time(),
-            "map_path": str(map_file_path),
-            "embeddings_path": str(embeddings_file_path)
-        }
-        
-        with open(sessions_file, 'wb') as f:
-            pickle.dump(sessions, f)
+        # Register lightweight session metadata in the session catalog
+        register_session(session_id, str(map_file_path), str(embeddings_file_path))
         
         if progress_callback:
             progress_callback("Mission data ready!", 100)
@@ -296,3 +379,5 @@ def _download_and_unpack_zip(zip_data: bytes, session_id: str, progress_callback
     except Exception as e:
         print(f"Error unpacking zip: {e}")
         return {"success": False, "error": f"Failed to unpack zip: {e}"}
+    finally:
+        zip_file.close()
@@ -0,0 +1,118 @@
+"""
+Device Session Store
+====================
+SQLite catalog of sessions stored locally under data/.
+
+Registering a session is a single row upsert, so the cost no longer grows
+with the number of stored sessions the way rewriting sessions.pkl did.
+Reads are served from an in-memory index that is rebuilt only when the
+catalog changes.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+
+DATA_DIR = Path("data")
+SESSIONS_DB = DATA_DIR / "sessions.db"
+LEGACY_SESSIONS_FILE = DATA_DIR / "sessions.pkl"
+
+# One shared connection plus the sessions index built from it
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_index: Optional[Dict[str, Any]] = None
+_index_version: Optional[int] = None
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the catalog, creating it (and migrating sessions.pkl) on first use."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(SESSIONS_DB, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        "id TEXT PRIMARY KEY, created_at REAL, map_path TEXT, embeddings_path TEXT, blob BLOB)"
+    )
+    if LEGACY_SESSIONS_FILE.exists():
+        _migrate_legacy_sessions(conn)
+    return conn
+
+
+def _migrate_legacy_sessions(conn: sqlite3.Connection):
+    """Copy entries from the old sessions.pkl into the catalog, then retire the file."""
+    try:
+        with open(LEGACY_SESSIONS_FILE, 'rb') as f:
+            sessions = pickle.load(f)
+    except Exception as e:
+        print(f"Could not read legacy sessions file: {e}")
+        sessions = {}
+
+    with conn:
+        for session_id, entry in sessions.items():
+            if isinstance(entry, dict):
+                row = (session_id, entry.get("created_at"), entry.get("map_path"),
+                       entry.get("embeddings_path"), None)
+            else:
+                # Full session objects keep their pickle in the blob column
+                row = (session_id, getattr(entry, "created_at", None), None, None,
+                       pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+            conn.execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?, ?)", row)
+
+    LEGACY_SESSIONS_FILE.rename(LEGACY_SESSIONS_FILE.with_suffix(".pkl.migrated"))
+    print(f"Migrated {len(sessions)} sessions from {LEGACY_SESSIONS_FILE}")
+
+
+def _connection() -> sqlite3.Connection:
+    """Return the shared connection, reopening it if the catalog file was removed."""
+    global _conn, _index
+    if _conn is None or not SESSIONS_DB.exists():
+        if _conn is not None:
+            _conn.close()
+        _conn = _connect()
+        _index = None
+    return _conn
+
+
+def _row_to_session(created_at, map_path, embeddings_path, blob) -> Any:
+    """Rebuild a catalog entry from its table row."""
+    if blob is not None:
+        return pickle.loads(blob)
+    return {
+        "created_at": created_at,
+        "map_path": map_path,
+        "embeddings_path": embeddings_path
+    }
+
+
+def register_session(session_id: str, map_path: Optional[str], embeddings_path: Optional[str]):
+    """Add or replace the catalog entry for a session."""
+    created_at = time.time()
+    with _lock:
+        conn = _connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                (session_id, created_at, map_path, embeddings_path, None)
+            )
+        if _index is not None:
+            _index[session_id] = _row_to_session(created_at, map_path, embeddings_path, None)
+
+
+def load_sessions() -> Dict[str, Any]:
+    """Return all sessions keyed by session ID."""
+    global _index, _index_version
+    with _lock:
+        conn = _connection()
+        # data_version only moves when another connection commits
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if _index is None or version != _index_version:
+            rows = conn.execute(
+                "SELECT id, created_at, map_path, embeddings_path, blob FROM sessions"
+            ).fetchall()
+            _index = {row[0]: _row_to_session(*row[1:]) for row in rows}
+            _index_version = version
+        return dict(_index)
@@ -2,30 +2,77 @@
 """Clean WebSocket client for real-time communication with AWS server."""
 
 import asyncio
+import functools
 import json
-import uuid
+import os
+import tempfile
+import secrets
+import aiohttp
 import websockets
 from typing import Dict, Any, Optional, Callable
+from urllib.parse import urlparse, urlunparse
 import logging
 
+from .http_utils import json_loads as _json_loads
+
 logger = logging.getLogger(__name__)
 
+# Fields of a progress_update message forwarded to the progress callback
+PROGRESS_FIELDS = (
+    "status", "progress", "message", "phase",
+    "tiles_completed", "total_tiles", "embeddings_processed", "total_embeddings"
+)
+
+# Completion frames may embed the whole base64 zip; the library default caps frames at 1 MiB
+WS_MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+# Large results are fetched from download_url through a buffer of this size
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+WS_SCHEMES = {"http": "ws", "https": "wss"}
+HTTP_SCHEMES = {ws: http for http, ws in WS_SCHEMES.items()}
+
+
+def _replace_scheme(url: str, schemes: Dict[str, str]) -> str:
+    """Return url with its scheme mapped through schemes; other parts are left untouched."""
+    parsed = urlparse(url)
+    return urlunparse(parsed._replace(scheme=schemes.get(parsed.scheme, parsed.scheme)))
+
+
+@functools.lru_cache(maxsize=None)
+def _to_ws(url: str) -> str:
+    """Return url with an http(s) scheme switched to ws(s)."""
+    return _replace_scheme(url, WS_SCHEMES)
+
+
+@functools.lru_cache(maxsize=None)
+def _to_http(url: str) -> str:
+    """Return url with a ws(s) scheme switched back to http(s)."""
+    return _replace_scheme(url, HTTP_SCHEMES)
+
+
 class CleanWebSocketClient:
     """Simplified WebSocket client with clean architecture."""
     
-    def __init__(self, server_url: str, progress_callback: Optional[Callable] = None):
+    def __init__(self, server_url: str, progress_callback: Optional[Callable] = None,
+                 http: Optional[aiohttp.ClientSession] = None):
         """
         Initialize WebSocket client.
         
         Args:
             server_url: AWS WebSocket server URL
             progress_callback: Function to call with progress updates
+            http: Pooled session used to download large results; without one,
+                  the result carries the server's download_url instead
         """
-        self.server_url = server_url.replace("http://", "ws://").replace("https://", "wss://")
-        self.connection_id = str(uuid.uuid4())
+        self.server_url = _to_ws(server_url)
+        self.http = http
+        self.connection_id = secrets.token_hex(16)
         self.websocket = None
         self.task_id = None
         self.progress_callback = progress_callback
+        self._last_progress = {}  # Last forwarded value of each progress field
         
     async def connect(self) -> bool:
         """Establish WebSocket connection to AWS server."""
@@ -33,7 +80,12 @@ class CleanWebSocketClient:
         logger.info(f"🔌 Connecting to WebSocket: {ws_url}")
         
         try:
-            self.websocket = await websockets.connect(ws_url)
+            # permessage-deflate and 20 s keepalive pings are already the library defaults
+            self.websocket = await websockets.connect(
+                ws_url,
+                max_size=WS_MAX_MESSAGE_BYTES,
+                write_limit=2 ** 20  # Buffer outgoing frames up to 1 MiB before send() waits
+            )
             logger.info(f"✅ WebSocket connected with ID: {self.connection_id}")
             return True
         except Exception as e:
@@ -80,14 +132,39 @@ class CleanWebSocketClient:
             logger.error(f"❌ Error in init_map: {e}")
             return {"success": False, "error": str(e)}
     
+    async def _stream_download_to_zip(self, download_url: str) -> str:
+        """Stream the result archive at download_url into a temp file and return its path."""
+        if download_url.startswith(("http://", "https://")):
+            url = download_url
+        else:
+            url = f"{_to_http(self.server_url)}{download_url}"
+        
+        fd, zip_path = tempfile.mkstemp(suffix=".zip")
+        # Replaces the pooled session's own timeout for this potentially long download
+        timeout = aiohttp.ClientTimeout(connect=30, sock_read=120)
+        try:
+            with os.fdopen(fd, 'wb') as zip_file:
+                async with self.http.get(url, timeout=timeout) as response:
+                    response.raise_for_status()
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                        zip_file.write(chunk)
+        except BaseException:
+            os.remove(zip_path)
+            raise
+        
+        logger.info(f"✅ Downloaded {os.path.getsize(zip_path)} bytes from {url}")
+        return zip_path
+    
     async def _listen_for_completion(self) -> Dict[str, Any]:
         """Listen for progress updates and completion."""
         try:
             async for message in self.websocket:
                 try:
-                    data = json.loads(message)
+                    data = _json_loads(message)
+                    # Look each field up once per frame
                     message_type = data.get("type")
-                    logger.debug(f"📨 Received message type: {message_type}, status: {data.get('status')}")
+                    status = data.get("status")
+                    logger.debug(f"📨 Received message type: {message_type}, status: {status}")
                     
                     if message_type == "task_started":
                         self.task_id = data.get("task_id")
@@ -95,50 +172,56 @@ class CleanWebSocketClient:
                         continue
                         
                     elif message_type == "progress_update":
-                        # Send progress update via callback (structured format)
+                        # Send only the fields that changed since the last update;
+                        # the device server debounces what it forwards to the UI
                         if self.progress_callback:
                             progress_data = {
-                                "status": data.get("status", "running"),
-                                "progress": data.get("progress", 0),
-                                "message": data.get("message", "Processing..."),
-                                "phase": data.get("phase", "unknown"),
-                                "tiles_completed": data.get("tiles_completed", 0),
-                                "total_tiles": data.get("total_tiles", 0),
-                                "embeddings_processed": data.get("embeddings_processed", 0),
-                                "total_embeddings": data.get("total_embeddings", 0)
+                                key: data[key] for key in PROGRESS_FIELDS
+                                if key in data and self._last_progress.get(key) != data[key]
                             }
                             
-                            # Call callback with structured data
-                            if asyncio.iscoroutinefunction(self.progress_callback):
-                                await self.progress_callback(progress_data)
-                            else:
-                                self.progress_callback(progress_data)
+                            if progress_data:
+                                self._last_progress.update(progress_data)
+                                
+                                # Call callback with structured delta
+                                if asyncio.iscoroutinefunction(self.progress_callback):
+                                    await self.progress_callback(progress_data)
+                                else:
+                                    self.progress_callback(progress_data)
                     
                     # Check for completion status (can be in any message type)
-                    status = data.get("status")
                     if status == "completed" or status == "complete":
-                        logger.info(f"🎉 Task completed! Session: {data.get('session_id')}")
+                        session_id = data.get("session_id")
+                        logger.info(f"🎉 Task completed! Session: {session_id}")
                         result = {
                             "success": True,
-                            "session_id": data.get("session_id"),
+                            "session_id": session_id,
                             "message": data.get("message", "Mission completed successfully")
                         }
                         
                         # Handle both zip_data (small files) and download_url (large files)
-                        if data.get("zip_data"):
-                            result["zip_data"] = data.get("zip_data")
+                        zip_data = data.get("zip_data")
+                        download_url = data.get("download_url")
+                        if zip_data:
+                            result["zip_data"] = zip_data
                             logger.info("✅ Received zip_data directly")
-                        elif data.get("download_url"):
-                            result["download_url"] = data.get("download_url")
+                        elif download_url and self.http is not None:
+                            # Fetch large results here; the caller owns (and removes) the file
+                            logger.info(f"📥 Downloading result from: {download_url}")
+                            result["zip_path"] = await self._stream_download_to_zip(download_url)
+                            result["zip_size"] = data.get("zip_size")
+                        elif download_url:
+                            result["download_url"] = download_url
                             result["zip_size"] = data.get("zip_size")
-                            logger.info(f"✅ Received download_url: {data.get('download_url')}")
+                            logger.info(f"✅ Received download_url: {download_url}")
                         
                         return result
                     elif status == "error":
-                        logger.error(f"❌ Task failed: {data.get('message')}")
+                        error_message = data.get("message", "Unknown error")
+                        logger.error(f"❌ Task failed: {error_message}")
                         return {
                             "success": False,
-                            "error": data.get("message", "Unknown error")
+                            "error": error_message
                         }
                     elif status and status != "running":
                         logger.warning(f"⚠️ Unexpected status: {status}")
@@ -190,7 +273,8 @@ _current_client: Optional[CleanWebSocketClient] = None
 async def call_server_init_map_websocket(lat: float, lng: float, meters: int = 1000, 
                                        server_url: str = "ws://ec2-16-171-238-14.eu-north-1.compute.amazonaws.com:5000", 
                                        session_id: Optional[str] = None,
-                                       progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
+                                       progress_callback: Optional[Callable] = None,
+                                       http: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
     """
     Execute init_map via WebSocket with clean architecture.
     
@@ -201,6 +285,8 @@ async def call_server_init_map_websocket(lat: float, lng: float, meters: int = 1
         server_url: WebSocket server URL
         session_id: Optional session ID for cached results
         progress_callback: Function to call with structured progress updates
+        http: Pooled session for downloading large results to a temp zip_path,
+              which the caller must remove; without it download_url is returned
     
     Returns:
         Dict with success status and result data
@@ -209,7 +295,7 @@ async def call_server_init_map_websocket(lat: float, lng: float, meters: int = 1
     
     try:
         # Create and connect client
-        _current_client = CleanWebSocketClient(server_url, progress_callback)
+        _current_client = CleanWebSocketClient(server_url, progress_callback, http)
         
         if not await _current_client.connect():
             return {"success": False, "error": "Failed to connect to WebSocket"}
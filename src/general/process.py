@@ -16,39 +16,47 @@ def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
     return dot_product / (norm_a * norm_b)
 
 
+def _patch_embedding(patch) -> Optional[np.ndarray]:
+    """Extract patch embedding robustly from dict or legacy field."""
+    patch_emb = None
+    if hasattr(patch, "embedding_data") and isinstance(patch.embedding_data, dict):
+        patch_emb = patch.embedding_data.get("embedding")
+    if patch_emb is None:
+        patch_emb = getattr(patch, "embedding", None)
+    return patch_emb
+
+
 def find_closest_patch(query_embedding: np.ndarray, session_data, metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """Find the closest patch in session data to the query embedding."""
     if not session_data or not session_data.patches:
         return None
 
-    best_similarity = -1.0
-    best_patch = None
+    # Some methods may pass dict from embedder; accept {"embedding": ...}
+    if isinstance(query_embedding, dict):
+        query_embedding = query_embedding.get("embedding")
+        if query_embedding is None:
+            return None
+    qe = np.asarray(query_embedding, dtype=np.float32)
 
+    patches = []
+    embeddings = []
     for patch in session_data.patches:
-        # Extract patch embedding robustly from dict or legacy field
-        patch_emb = None
-        if hasattr(patch, "embedding_data") and isinstance(patch.embedding_data, dict):
-            patch_emb = patch.embedding_data.get("embedding")
-        if patch_emb is None:
-            patch_emb = getattr(patch, "embedding", None)
-        if patch_emb is None:
-            continue
-
-        # Ensure both are numpy arrays of float32
-        patch_emb = np.asarray(patch_emb, dtype=np.float32)
-        qe = np.asarray(query_embedding, dtype=np.float32)
+        patch_emb = _patch_embedding(patch)
+        if patch_emb is not None:
+            patches.append(patch)
+            embeddings.append(patch_emb)
+    if not patches:
+        return None
 
-        # Some methods may pass dict from embedder; accept {"embedding": ...}
-        if isinstance(query_embedding, dict):
-            qe_raw = query_embedding.get("embedding")
-            if qe_raw is None:
-                continue
-            qe = np.asarray(qe_raw, dtype=np.float32)
+    # Score every patch at once: one (N, D) float32 matrix instead of N small arrays
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(qe)
+    dots = matrix @ qe
+    similarities = np.divide(dots, norms, out=np.zeros_like(dots), where=norms != 0)
 
-        similarity = cosine_similarity(qe, patch_emb)
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_patch = patch
+    best_index = int(np.argmax(similarities))
+    best_similarity = float(similarities[best_index])
+    best_patch = patches[best_index] if best_similarity > -1.0 else None
 
     if best_patch is None:
         return None
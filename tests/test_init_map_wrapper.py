@@ -0,0 +1,103 @@
+"""
+Tests for the device init_map wrapper.
+
+Run with: python -m unittest discover -s tests -t .
+"""
+
+import asyncio
+import io
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+import aiohttp
+
+from src.device import init_map_wrapper
+
+
+class InflightCoalescingTest(unittest.IsolatedAsyncioTestCase):
+    """Identical concurrent init_map calls share one server request."""
+
+    async def test_cancelled_follower_does_not_cancel_shared_result(self):
+        release = asyncio.Event()
+        server_calls = []
+
+        async def fake_server_call(*args):
+            server_calls.append(args)
+            await release.wait()
+            return {"success": True, "session_id": "shared"}
+
+        with mock.patch.object(init_map_wrapper, "_call_server_init_map", fake_server_call):
+            call = lambda: init_map_wrapper.call_server_init_map_async(1.0, 2.0, 500, "http://test")
+            leader = asyncio.create_task(call())
+            await asyncio.sleep(0)
+            cancelled_follower = asyncio.create_task(call())
+            follower = asyncio.create_task(call())
+            await asyncio.sleep(0)
+
+            cancelled_follower.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled_follower
+
+            release.set()
+            expected = {"success": True, "session_id": "shared"}
+            self.assertEqual(await leader, expected)
+            self.assertEqual(await follower, expected)
+
+        self.assertEqual(len(server_calls), 1)
+        self.assertEqual(init_map_wrapper._inflight, {})
+
+
+class FetchSplitTest(unittest.IsolatedAsyncioTestCase):
+    """A failed split download leaves the session's earlier files alone."""
+
+    async def test_failed_refetch_keeps_previous_files(self):
+        tmp_dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        targets = {"map.png": tmp_dir / "s.png", "embeddings.json": tmp_dir / "s.json"}
+        for file_path in targets.values():
+            file_path.write_bytes(b"previous")
+
+        async def fake_download(http, url, file_path):
+            if url == "bad":
+                await asyncio.sleep(0)
+                raise aiohttp.ClientError("boom")
+            with open(file_path, "wb") as dst:
+                dst.write(b"partial")
+            await asyncio.sleep(10)
+
+        with mock.patch.object(init_map_wrapper, "_session_file_paths", return_value=targets), \
+                mock.patch.object(init_map_wrapper, "_download_file", fake_download), \
+                mock.patch.object(init_map_wrapper, "register_session") as register:
+            result = await init_map_wrapper._fetch_split(None, "good", "bad", "s")
+
+        self.assertEqual(result, {"success": False, "error": "Download failed: boom"})
+        register.assert_not_called()
+        self.assertEqual(sorted(p.name for p in tmp_dir.iterdir()), ["s.json", "s.png"])
+        for file_path in targets.values():
+            self.assertEqual(file_path.read_bytes(), b"previous")
+
+
+class UnpackArchiveTest(unittest.TestCase):
+    """An archive without map.png or embeddings.json stores nothing."""
+
+    def test_zip_missing_member_registers_nothing(self):
+        tmp_dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        targets = {"map.png": tmp_dir / "s.png", "embeddings.json": tmp_dir / "s.json"}
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("map.png", b"png")
+
+        with mock.patch.object(init_map_wrapper, "_session_file_paths", return_value=targets), \
+                mock.patch.object(init_map_wrapper, "register_session") as register:
+            result = init_map_wrapper._download_and_unpack_zip(archive.getvalue(), "s")
+
+        self.assertFalse(result["success"])
+        self.assertIn("embeddings.json", result["error"])
+        register.assert_not_called()
+        self.assertEqual(list(tmp_dir.iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
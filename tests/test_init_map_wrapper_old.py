@@ -0,0 +1,29 @@
+"""
+Tests for the legacy device init_map wrapper.
+
+Run with: python -m unittest discover -s tests -t .
+"""
+
+import base64
+import io
+import os
+import unittest
+
+from src.device import init_map_wrapper_old
+
+
+class StreamB64Test(unittest.TestCase):
+    """Base64 strings decode slice by slice whatever their line breaks."""
+
+    def test_mime_line_breaks_decode(self):
+        data = os.urandom(3 * init_map_wrapper_old.B64_CHUNK_CHARS + 7)
+        for encoded in (base64.b64encode(data).decode(),
+                        base64.encodebytes(data).decode(),
+                        base64.encodebytes(data).decode().replace("\n", "\r\n")):
+            decoded = io.BytesIO()
+            init_map_wrapper_old._stream_b64_to_file(encoded, decoded)
+            self.assertEqual(decoded.getvalue(), data)
+
+
+if __name__ == "__main__":
+    unittest.main()